@@ -1,155 +1,119 @@
+import csv
 import io
+import pandas as pd
 import streamlit as st
-import qrcode
-from PIL import Image, ImageDraw, ImageFont
-from typing import List, Tuple
 
-# ==========================================
-# 1. CONFIGURATION & DESIGN TOKENS
-# ==========================================
-class Design:
-    RED = "#FF4B4B"      
-    BLUE = "#42a5f5"     
-    SOFT_GRAY = "#F1F5F9" 
-    DARK_TEXT = "#000000"
-    WHITE = "#FFFFFF"
-    BTN_BG = "#1E293B" 
-    
-    # Unified horizontal size for all types
-    LABEL_W, LABEL_H = 5.0, 3.5
-    
-    APP_TITLE = "Finatech Labeling Tool"
-
-# ==========================================
-# 2. CORE RENDERING ENGINE
-# ==========================================
-def cm_to_px(cm: float, dpi: int) -> int:
-    return int(round((cm / 2.54) * dpi))
-
-def pt_to_px(pt: float, dpi: int) -> int:
-    return int(round((pt * dpi) / 72.0))
-
-def get_font(size_px: int) -> ImageFont.FreeTypeFont:
-    paths = ["/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf", "DejaVuSans-Bold.ttf", "arialbd.ttf"]
-    for p in paths:
-        try: return ImageFont.truetype(p, size=max(6, int(size_px)))
-        except: continue
-    return ImageFont.load_default()
-
-def fit_text(draw: ImageDraw.ImageDraw, text: str, max_w: int, max_h: int, start_pt: float, dpi: int) -> ImageFont.FreeTypeFont:
-    size = pt_to_px(start_pt, dpi)
-    while size >= 6:
-        font = get_font(size)
-        bbox = draw.textbbox((0, 0), text, font=font)
-        if (bbox[2] - bbox[0]) <= max_w and (bbox[3] - bbox[1]) <= max_h:
-            return font
-        size -= 1
-    return get_font(6)
-
-def generate_qr(data: str, size_px: int) -> Image.Image:
-    qr_data = data if data.strip() else " "
-    qr = qrcode.QRCode(version=None, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=1)
-    qr.add_data(qr_data)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="#1E293B", back_color="white").convert("RGBA")
-    return img.resize((size_px, size_px), resample=Image.Resampling.LANCZOS)
-
-def render_label(qr_data: str, items: List[Tuple[str, str]], dpi: int, font_pt: float) -> Image.Image:
-    W, H = cm_to_px(Design.LABEL_W, dpi), cm_to_px(Design.LABEL_H, dpi)
-    img = Image.new("RGBA", (W, H), Design.WHITE)
-    draw = ImageDraw.Draw(img)
-    
-    padding, gap = int(0.06 * H), int(0.03 * H)
-    qr_side = H - (2 * padding)
-    img.alpha_composite(generate_qr(qr_data, qr_side), (padding, padding))
-    
-    panel_x0 = qr_side + (2 * padding)
-    panel_w = W - panel_x0 - padding
-    
-    # Proportions based on 6 slots (Fiber 2U logic) to keep sizes consistent
-    max_slots = 6
-    slot_h = (H - (2 * padding) - (max_slots - 1) * gap) // max_slots
-    stack_h = (len(items) * slot_h) + ((len(items) - 1) * gap)
-    current_y = (H - stack_h) // 2
-    
-    for text, color in items:
-        fill_color = color if text.strip() else Design.SOFT_GRAY
-        draw.rounded_rectangle([(panel_x0, current_y), (panel_x0 + panel_w, current_y + slot_h)], radius=slot_h // 2, fill=fill_color)
-        if text.strip():
-            font = fit_text(draw, text, panel_w * 0.85, slot_h * 0.7, font_pt, dpi)
-            draw.text((panel_x0 + panel_w // 2, current_y + slot_h // 2), text, font=font, fill=Design.DARK_TEXT, anchor="mm")
-        current_y += slot_h + gap
-    return img.convert("RGB")
+from renderers import APP_CSS, Design, DPI_OPTIONS, render_batch_zip, render_label_png, render_label_png_compact
 
 # ==========================================
-# 3. STREAMLIT INTERFACE
+# STREAMLIT INTERFACE
 # ==========================================
 st.set_page_config(page_title=Design.APP_TITLE, layout="wide")
 
-st.markdown(f"""
-    <style>
-    .stApp {{ background-color: #F8FAFC; }}
-    div[data-testid="stRadio"] div[role="radiogroup"] label:nth-of-type(1) p {{ color: {Design.RED} !important; font-weight: 600; }}
-    div[data-testid="stRadio"] div[role="radiogroup"] label:nth-of-type(2) p {{ color: {Design.BLUE} !important; font-weight: 600; }}
-    div.stButton > button {{ background-color: {Design.BTN_BG} !important; color: white !important; border: 1px solid {Design.BTN_BG} !important; }}
-    </style>
-""", unsafe_allow_html=True)
+st.markdown(APP_CSS, unsafe_allow_html=True)
+
+@st.fragment
+def preview_panel(dpi: int, custom_name: str):
+    # Isolated as a fragment so interactions inside the panel (e.g. the
+    # download click) rerun only this block, not the whole script.
+    st.subheader("Label Preview")
+    if "label_png" in st.session_state:
+        # The on-screen preview always shows the smallest rendering — the
+        # browser displays it at roughly that size anyway — while the
+        # download serves the DPI the user selected.
+        st.image(st.session_state["label_png"], use_container_width=False)
+
+        # Use the custom name provided by user
+        full_filename = f"{custom_name}.png" if not custom_name.endswith(".png") else custom_name
+
+        # Callable data: the print-quality level-9 encode only runs when the
+        # browser actually requests the file, not on every preview rerun.
+        qr_text, items, f_size = st.session_state["label_key"]
+        st.download_button(
+            label=f"💾 Download {full_filename}",
+            data=lambda: render_label_png_compact(qr_text, list(items), dpi, f_size),
+            file_name=full_filename,
+            mime="image/png",
+            use_container_width=True
+        )
+    else:
+        st.info("Fill the IDs and click **Generate Label**.")
 
 def main():
     st.title(f"🏷️ {Design.APP_TITLE}")
-    
+
     col_form, col_pre = st.columns([1.1, 1], gap="large")
-    
+
     with col_form:
         with st.container(border=True):
             st.subheader("Global Settings")
-            l_type = st.selectbox("Patch Panel Type", ["Copper 24P", "Copper 48P", "Fiber 1 Unit", "Fiber 2 Unit"])
-            
+            # These two stay outside the form: the panel type changes how many
+            # ID fields render, and the DPI slider swaps precomputed previews.
             c1, c2 = st.columns(2)
-            dpi = c1.select_slider("Print Quality (DPI)", options=[150, 300, 600], value=300)
-            f_size = c2.number_input("Font Size (Pt)", value=8) 
-            qr_text = st.text_area("QR Code Metadata", value="", height=80)
+            l_type = c1.selectbox("Patch Panel Type", ["Copper 24P", "Copper 48P", "Fiber 1 Unit", "Fiber 2 Unit"])
+            dpi = c2.select_slider("Print Quality (DPI)", options=list(DPI_OPTIONS), value=300)
 
-            st.divider()
-            st.subheader("Labeling Configuration")
-            
             # Map choice to pill count
             counts = {"Copper 24P": 2, "Copper 48P": 4, "Fiber 1 Unit": 3, "Fiber 2 Unit": 6}
             num_fields = counts[l_type]
-            
-            items_to_render = []
-            for i in range(num_fields):
-                r1, r2 = st.columns([2, 1])
-                t = r1.text_input(f"ID {i+1}", key=f"t{i}", label_visibility="collapsed", placeholder=f"Label Text {i+1}")
-                c = r2.radio(f"Col {i+1}", ["Red", "Blue"], key=f"c{i}", horizontal=True, label_visibility="collapsed")
-                items_to_render.append((t, Design.RED if c == "Red" else Design.BLUE))
-
-            st.divider()
-            st.subheader("Save Settings")
-            custom_name = st.text_input("Filename", value=f"{l_type.replace(' ', '_').lower()}")
-            generate = st.button("Generate Label", use_container_width=True)
+
+            # The form buffers keystrokes and radio flips so the script only
+            # reruns on submit instead of on every widget interaction.
+            with st.form("label_form", border=False):
+                f_size = st.number_input("Font Size (Pt)", value=8)
+                qr_text = st.text_area("QR Code Metadata", value="", height=80)
+
+                st.divider()
+                st.subheader("Labeling Configuration")
+
+                # One grid widget instead of 2 columns + text_input + radio
+                # per row; far less to serialize and diff on each rerun.
+                edited = st.data_editor(
+                    pd.DataFrame({"ID": [""] * num_fields, "Color": ["Red"] * num_fields}),
+                    column_config={
+                        "ID": st.column_config.TextColumn("ID"),
+                        "Color": st.column_config.SelectboxColumn("Color", options=["Red", "Blue"], required=True),
+                    },
+                    num_rows="fixed",
+                    hide_index=True,
+                    use_container_width=True,
+                    key=f"items_{num_fields}",
+                )
+                items_to_render = [(str(row.ID or ""), Design.RED if row.Color == "Red" else Design.BLUE)
+                                   for row in edited.itertuples()]
+
+                st.divider()
+                st.subheader("Save Settings")
+                custom_name = st.text_input("Filename", value=f"{l_type.replace(' ', '_').lower()}")
+                generate = st.form_submit_button("Generate Label", use_container_width=True)
+
+        with st.container(border=True):
+            st.subheader("Bulk Generation")
+            bulk_file = st.file_uploader("CSV — one label per row: QR metadata, then one column per ID", type=["csv"])
+            bulk = st.button("Generate Batch", use_container_width=True, disabled=bulk_file is None)
 
     with col_pre:
-        st.subheader("Label Preview")
         if generate:
-            final_img = render_label(qr_text, items_to_render, dpi, f_size)
-            st.image(final_img, use_container_width=False)
-            
-            buf = io.BytesIO()
-            final_img.save(buf, format="PNG", dpi=(dpi, dpi))
-            
-            # Use the custom name provided by user
-            full_filename = f"{custom_name}.png" if not custom_name.endswith(".png") else custom_name
-            
+            # Re-submits with unchanged inputs skip even the cache lookups.
+            label_key = (qr_text, tuple(items_to_render), f_size)
+            if st.session_state.get("label_key") != label_key:
+                # Only the preview rendering is needed up front; the selected
+                # DPI is encoded on demand when the download is requested.
+                st.session_state["label_png"] = render_label_png(qr_text, items_to_render, DPI_OPTIONS[0], f_size)
+                st.session_state["label_key"] = label_key
+        preview_panel(dpi, custom_name)
+
+        if bulk and bulk_file is not None:
+            rows = [r for r in csv.reader(io.StringIO(bulk_file.getvalue().decode("utf-8-sig"))) if any(c.strip() for c in r)]
+            colors = [c for _, c in items_to_render]
+            zip_bytes = render_batch_zip(rows, colors, dpi, f_size, custom_name)
             st.download_button(
-                label=f"💾 Download {full_filename}",
-                data=buf.getvalue(),
-                file_name=full_filename,
-                mime="image/png",
+                label=f"💾 Download {custom_name}_batch.zip ({len(rows)} labels)",
+                data=zip_bytes,
+                file_name=f"{custom_name}_batch.zip",
+                mime="application/zip",
                 use_container_width=True
             )
-        else:
-            st.info("Fill the IDs and click **Generate Label**.")
 
 if __name__ == "__main__":
     main()
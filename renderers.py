@@ -0,0 +1,263 @@
+import functools
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import streamlit as st
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+from typing import List, NamedTuple, Tuple
+
+# ==========================================
+# 1. CONFIGURATION & DESIGN TOKENS
+# ==========================================
+class Design:
+    RED = "#FF4B4B"
+    BLUE = "#42a5f5"
+    SOFT_GRAY = "#F1F5F9"
+    DARK_TEXT = "#000000"
+    WHITE = "#FFFFFF"
+    BTN_BG = "#1E293B"
+
+    # Unified horizontal size for all types
+    LABEL_W, LABEL_H = 5.0, 3.5
+
+    APP_TITLE = "Finatech Labeling Tool"
+
+# Built here (imported once per process) so reruns of the UI script don't
+# re-interpolate the block; Streamlit still has to emit it each rerun.
+APP_CSS = f"""
+    <style>
+    .stApp {{ background-color: #F8FAFC; }}
+    div.stButton > button {{ background-color: {Design.BTN_BG} !important; color: white !important; border: 1px solid {Design.BTN_BG} !important; }}
+    </style>
+"""
+
+# ==========================================
+# 2. CORE RENDERING ENGINE
+# ==========================================
+# Scaled-integer forms of cm*dpi/2.54 and pt*dpi/72 with round-half-up;
+# sizes come in hundredths so the float round() protocol never runs.
+def cm_to_px(cm: float, dpi: int) -> int:
+    return (round(cm * 100) * dpi + 127) // 254
+
+def pt_to_px(pt: float, dpi: int) -> int:
+    return (round(pt * 100) * dpi + 3600) // 7200
+
+def _load_base_font() -> ImageFont.FreeTypeFont:
+    paths = ["/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf", "DejaVuSans-Bold.ttf", "arialbd.ttf"]
+    for p in paths:
+        try: return ImageFont.truetype(p, size=64)
+        except OSError: continue
+    return None
+
+_BASE_FONT = _load_base_font()
+
+@functools.lru_cache(maxsize=256)
+def get_font(size_px: int) -> ImageFont.FreeTypeFont:
+    if _BASE_FONT is not None:
+        # font_variant clones the already-parsed face, skipping file I/O.
+        return _BASE_FONT.font_variant(size=max(6, int(size_px)))
+    return ImageFont.load_default()
+
+@functools.lru_cache(maxsize=1024)
+def _text_width(text: str, size: int) -> float:
+    # getlength gives the horizontal advance without a full bbox trace;
+    # caching it lets recurring IDs (batch rows, regenerated labels) skip
+    # glyph shaping entirely.
+    return get_font(size).getlength(text)
+
+@functools.lru_cache(maxsize=512)
+def fit_text(text: str, max_w: int, max_h: int, start_pt: float, dpi: int) -> ImageFont.FreeTypeFont:
+    def measure(size: int) -> Tuple[float, int]:
+        # The bundled face's cap height stays under the nominal size, so the
+        # size itself is a safe height bound.
+        return _text_width(text, size), size
+
+    # Glyph metrics scale ~linearly with size, so one measurement at the
+    # starting size gives a near-exact estimate; a short shrink loop then
+    # corrects for rounding instead of probing every size linearly.
+    start = pt_to_px(start_pt, dpi)
+    w0, h0 = measure(start)
+    scale = min(max_w / max(1, w0), max_h / max(1, h0))
+    size = max(6, min(start, int(start * scale)))
+    w, h = measure(size)
+    while size > 6 and (w > max_w or h > max_h):
+        size -= 1
+        w, h = measure(size)
+    return get_font(size)
+
+# Byte-mode capacity per QR version at error level L; picking the version
+# up front skips the encoder's 1..40 fit search for typical short payloads.
+_QR_BYTE_CAPACITY_L = (17, 32, 53, 78, 106, 134, 154, 192, 230, 271)
+
+def _qr_version(payload: str) -> int:
+    n = len(payload.encode("utf-8"))
+    for version, capacity in enumerate(_QR_BYTE_CAPACITY_L, start=1):
+        if n <= capacity:
+            return version
+    return None
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def generate_qr(data: str, size_px: int) -> Image.Image:
+    import segno  # deferred: only needed once the user actually generates
+
+    qr_data = data if data.strip() else " "
+    code = segno.make(qr_data, error="l", micro=False, version=_qr_version(qr_data))
+
+    # Tile the module matrix straight into a pixel buffer instead of drawing
+    # per-module rectangles and resizing afterwards.
+    matrix = np.pad(np.array(code.matrix, dtype=bool), 1)  # 1-module quiet zone
+    cell = max(1, size_px // matrix.shape[0])
+    scaled = np.kron(matrix, np.ones((cell, cell), dtype=bool))
+    dark = (0x1E, 0x29, 0x3B)
+    pad = size_px - scaled.shape[0]
+    if pad < 0:
+        # Only reachable when the matrix outgrows the target; BOX averages
+        # whole modules on the way down instead of dropping rows like NEAREST.
+        arr = np.full(scaled.shape + (3,), 0xFF, dtype=np.uint8)
+        arr[scaled] = dark
+        return Image.fromarray(arr).resize((size_px, size_px), resample=Image.Resampling.BOX)
+    # Colorize and center-pad in one masked write into the final buffer.
+    arr = np.full((size_px, size_px, 3), 0xFF, dtype=np.uint8)
+    lo = pad // 2
+    arr[lo:lo + scaled.shape[0], lo:lo + scaled.shape[1]][scaled] = dark
+    return Image.fromarray(arr)
+
+@functools.lru_cache(maxsize=32)
+def hex_rgb(color: str) -> Tuple[int, int, int]:
+    """Parse a hex color once; draw sites reuse the tuple."""
+    return ImageColor.getrgb(color)
+
+@functools.lru_cache(maxsize=64)
+def pill_mask(w: int, h: int) -> np.ndarray:
+    """Boolean coverage mask for a filled pill (rounded rect, radius = h/2)."""
+    r = h / 2.0
+    y, x = np.ogrid[:h, :w]
+    qx = np.maximum(np.abs(x + 0.5 - w / 2.0) - (w / 2.0 - r), 0.0)
+    qy = np.abs(y + 0.5 - h / 2.0)
+    return (qx * qx + qy * qy) <= r * r
+
+# The UI only offers a fixed DPI set; resolve the canvas size for each once.
+DPI_OPTIONS = (150, 300, 600)
+_CANVAS_PX = {dpi: (cm_to_px(Design.LABEL_W, dpi), cm_to_px(Design.LABEL_H, dpi)) for dpi in DPI_OPTIONS}
+
+class Layout(NamedTuple):
+    W: int
+    H: int
+    padding: int
+    gap: int
+    qr_side: int
+    panel_x0: int
+    panel_w: int
+    slot_h: int
+
+@functools.lru_cache(maxsize=8)
+def _layout(dpi: int) -> Layout:
+    W, H = _CANVAS_PX.get(dpi) or (cm_to_px(Design.LABEL_W, dpi), cm_to_px(Design.LABEL_H, dpi))
+    padding, gap = int(0.06 * H), int(0.03 * H)
+    qr_side = H - (2 * padding)
+    panel_x0 = qr_side + (2 * padding)
+    panel_w = W - panel_x0 - padding
+    # Proportions based on 6 slots (Fiber 2U logic) to keep sizes consistent
+    max_slots = 6
+    slot_h = (H - (2 * padding) - (max_slots - 1) * gap) // max_slots
+    return Layout(W, H, padding, gap, qr_side, panel_x0, panel_w, slot_h)
+
+@functools.lru_cache(maxsize=256)
+def _render_pill(text: str, color: str, w: int, h: int, font_size: int) -> np.ndarray:
+    """Rasterize one pill (background + centered text) on white, cached.
+
+    Port IDs recur constantly across regenerations and batch rows, so a
+    repeated slot becomes a single array copy into the canvas.
+    """
+    arr = np.full((h, w, 3), 0xFF, dtype=np.uint8)
+    arr[pill_mask(w, h)] = hex_rgb(color)
+    if text:
+        img = Image.fromarray(arr)
+        ImageDraw.Draw(img).text((w // 2, h // 2), text, font=get_font(font_size), fill=Design.DARK_TEXT, anchor="mm")
+        arr = np.asarray(img)
+    return arr
+
+def render_label(qr_data: str, items: List[Tuple[str, str]], dpi: int, font_pt: float) -> Image.Image:
+    L = _layout(dpi)
+    W, H, padding, gap = L.W, L.H, L.padding, L.gap
+    qr_side, panel_x0, panel_w, slot_h = L.qr_side, L.panel_x0, L.panel_w, L.slot_h
+
+    arr = np.full((H, W, 3), 0xFF, dtype=np.uint8)
+    arr[padding:padding + qr_side, padding:padding + qr_side] = np.asarray(generate_qr(qr_data, qr_side))
+
+    stack_h = (len(items) * slot_h) + ((len(items) - 1) * gap)
+    current_y = (H - stack_h) // 2
+
+    # All slots share the same box, so the widest text sets the limiting
+    # size — fit it once and reuse the font for every slot. This also keeps
+    # the type size uniform across the label. Width is measured, not counted:
+    # glyph widths vary ~3x, so a short wide ID can out-measure a longer one.
+    filled = [text for text, _ in items if text.strip()]
+    widest = max(filled, key=lambda t: _text_width(t, 64)) if filled else None
+    font = fit_text(widest, panel_w * 0.85, slot_h * 0.7, font_pt, dpi) if filled else None
+
+    # Each slot blits in as one cached pill raster (background + text).
+    for text, color in items:
+        if text.strip():
+            pill = _render_pill(text, color, panel_w, slot_h, getattr(font, "size", 6))
+        else:
+            pill = _render_pill("", Design.SOFT_GRAY, panel_w, slot_h, 0)
+        arr[current_y:current_y + slot_h, panel_x0:panel_x0 + panel_w] = pill
+        current_y += slot_h + gap
+
+    return Image.fromarray(arr)
+
+# A label holds two pill colors, black text, white, gray — plus anti-alias
+# shades around the glyphs. 32 palette entries keeps the text edges smooth.
+_PNG_PALETTE_COLORS = 32
+
+def _quantize(img: Image.Image) -> Image.Image:
+    # Palettizing before save means Deflate sees 1 byte/pixel instead of 3;
+    # both the encode time and the file size drop roughly in proportion.
+    return img.quantize(colors=_PNG_PALETTE_COLORS, method=Image.Quantize.FASTOCTREE)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def render_label_png(qr_data: str, items: List[Tuple[str, str]], dpi: int, font_pt: float) -> bytes:
+    """Render a label and encode it as PNG once; identical submits hit the cache."""
+    buf = io.BytesIO()
+    # Level 1 is ~3-5x faster than the zlib default and loses almost
+    # nothing on flat-color label art.
+    _quantize(render_label(qr_data, items, dpi, font_pt)).save(buf, format="PNG", dpi=(dpi, dpi), optimize=False, compress_level=1)
+    return buf.getvalue()
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def render_label_png_compact(qr_data: str, items: List[Tuple[str, str]], dpi: int, font_pt: float) -> bytes:
+    """Print-ready encode at maximum compression.
+
+    Deliberately separate from the level-1 preview encode: wired through
+    st.download_button's callable data, it only runs when a download is
+    actually requested.
+    """
+    buf = io.BytesIO()
+    _quantize(render_label(qr_data, items, dpi, font_pt)).save(buf, format="PNG", dpi=(dpi, dpi), optimize=True, compress_level=9)
+    return buf.getvalue()
+
+def render_batch_zip(rows: List[List[str]], colors: List[str], dpi: int, font_pt: float, basename: str) -> bytes:
+    """Render one label per CSV row (QR payload, then slot texts) into a ZIP.
+
+    Labels are independent, so they render on a thread pool — Pillow and zlib
+    release the GIL in the heavy paths.
+    """
+    num_fields = len(colors)
+    jobs = []
+    for row in rows:
+        qr_data = row[0].strip() if row else ""
+        texts = [t.strip() for t in row[1:num_fields + 1]]
+        texts += [""] * (num_fields - len(texts))
+        jobs.append((qr_data, list(zip(texts, colors))))
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as ex:
+        pngs = list(ex.map(lambda j: render_label_png(j[0], j[1], dpi, font_pt), jobs))
+
+    zbuf = io.BytesIO()
+    with zipfile.ZipFile(zbuf, "w", zipfile.ZIP_STORED) as zf:
+        for i, png in enumerate(pngs, 1):
+            zf.writestr(f"{basename}_{i:03d}.png", png)
+    return zbuf.getvalue()